@@ -0,0 +1,128 @@
+import asyncio
+import os
+import re
+import utility
+
+from pathlib import Path
+from itertools import zip_longest
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1 << 16
+TOKEN = re.compile(rb"\S+")
+
+
+class AnswerMismatch:
+    def __init__(self, test: str, index: Optional[int] = None,
+                 expected_offset: Optional[int] = None, expected: Optional[bytes] = None,
+                 actual_offset: Optional[int] = None, actual: Optional[bytes] = None,
+                 reason: Optional[str] = None):
+        """Either a differing token or, when the answer could not be produced, a reason"""
+        self.test = test
+        self.index = index
+        self.expected_offset = expected_offset
+        self.expected = expected
+        self.actual_offset = actual_offset
+        self.actual = actual
+        self.reason = reason
+
+    def __str__(self):
+        if self.reason is not None:
+            return f"{self.test}: {self.reason}"
+        return (f"{self.test}: token #{self.index} differs, "
+                f"expected {describe_token(self.expected, self.expected_offset)}, "
+                f"got {describe_token(self.actual, self.actual_offset)}")
+
+
+def describe_token(token: Optional[bytes], offset: Optional[int]) -> str:
+    if token is None:
+        return "end of file"
+    text = token[:32].decode(errors='replace')
+    if len(token) > 32:
+        text += "..."
+    return f"'{text}' at byte {offset}"
+
+
+def describe_failure(returncode: Optional[int]) -> str:
+    if returncode is not None and returncode < 0:
+        return f"solution killed by signal {-returncode}"
+    return f"solution exited with {returncode}"
+
+
+def read_tokens(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """Yields (byte offset, token) pairs of whitespace separated tokens,
+    reading the stream chunk by chunk."""
+    consumed = 0
+    carry = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = carry + chunk
+        data_offset = consumed - len(carry)
+        consumed += len(chunk)
+        carry = b""
+        for match in TOKEN.finditer(data):
+            # Token touching the end of the chunk may continue in the next one
+            if match.end() == len(data):
+                carry = match.group()
+                break
+            yield data_offset + match.start(), match.group()
+    if carry:
+        yield consumed - len(carry), carry
+
+
+def compare_streams(test: str, expected: BinaryIO, actual: BinaryIO) -> Optional[AnswerMismatch]:
+    tokens = zip_longest(read_tokens(expected), read_tokens(actual), fillvalue=(None, None))
+    for index, ((expected_offset, expected_token), (actual_offset, actual_token)) in enumerate(tokens):
+        if expected_token != actual_token:
+            return AnswerMismatch(test, index, expected_offset, expected_token,
+                                  actual_offset, actual_token)
+    return None
+
+
+def compare_files(test: str, expected: Path, actual: Path) -> Optional[AnswerMismatch]:
+    with expected.open('rb') as fexpected, actual.open('rb') as factual:
+        return compare_streams(test, fexpected, factual)
+
+
+async def check_answer(solution: Path, input_file: Path, answer_file: Path,
+                       output_file: Path) -> Tuple[Optional[AnswerMismatch], Optional[float]]:
+    """Returns the mismatch, if any, and the solution CPU time"""
+    if not answer_file.exists():
+        print(f"\t{answer_file} : MISSING")
+        return AnswerMismatch(answer_file.name, reason=f"answer file for {input_file.name} does not exist"), None
+    try:
+        try:
+            solution_time = await utility.run_timed([str(solution)], input_file, output_file)
+        except utility.NonZeroReturnCode as e:
+            print(f"\t{answer_file} : SOLUTION FAILED")
+            return AnswerMismatch(answer_file.name, reason=describe_failure(e.returncode)), None
+        loop = asyncio.get_event_loop()
+        mismatch = await loop.run_in_executor(None, compare_files, answer_file.name,
+                                              answer_file, output_file)
+    finally:
+        if output_file.exists():
+            output_file.unlink()
+    print(f"\t{answer_file} : {'OK!' if mismatch is None else 'MISMATCH'}")
+    return mismatch, solution_time
+
+
+async def check_answers(solution: Path, tests: List[Tuple[Path, Path]],
+                        work_dir: Path) -> Tuple[List[AnswerMismatch], Dict[str, float]]:
+    """Runs the solution on every (input, answer) pair in parallel and
+    returns the mismatching answers and solution times per input file."""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+
+    async def limited(input_file: Path, answer_file: Path):
+        async with semaphore:
+            return await check_answer(solution, input_file, answer_file,
+                                      work_dir.joinpath(answer_file.name))
+
+    results = await asyncio.gather(*(limited(input_file, answer_file)
+                                     for input_file, answer_file in tests))
+    mismatches = [mismatch for mismatch, _ in results if mismatch is not None]
+    solution_times = {input_file.name: solution_time
+                      for (input_file, _), (_, solution_time) in zip(tests, results)
+                      if solution_time is not None}
+    return mismatches, solution_times
@@ -1,20 +1,56 @@
+import asyncio
 import os
 import sys
+import time
+import inspect
+import functools
+import multiprocessing
 import shutil
 import tempfile
 import subprocess
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from worst_case import WorstCaseSearch
+from history import History, source_hashes
+import manifest
+import utility
+
+# Write buffer of Python generator output files
+WRITE_BUFFER = 1 << 20
 
 def compile(source:Path, output:Path):
     print(f"Compiling {source} to {output}")
     subprocess.run(["g++", "-Wall", "-std=c++14", "-g", "-o", output.absolute(), source.absolute()])\
         .check_returncode()
 
+def RunPythonGenerator(generator, args, input:Path, output:Path, solution:Path):
+    """Runs in a worker process: writes the test with generator(args, stream)
+    and solves it. Returns (generation_time, solve_time)."""
+    start = time.perf_counter()
+    with input.open('wb', buffering = WRITE_BUFFER) as finp:
+        generator(args, finp)
+    generation_time = time.perf_counter() - start
+    print(f"Generating answer {output}")
+    start = time.perf_counter()
+    with input.open('rb') as finp:
+        with output.open('wb') as fout:
+            subprocess.run([solution.absolute()], stdin = finp, stdout = fout,
+                           stderr = sys.stdout.buffer) \
+                .check_returncode()
+    return generation_time, time.perf_counter() - start
+
 class TestGen:
 
-    def __init__(self, filename, generator, solution, output_dir):
+    def __init__(self, filename, generator, solution, output_dir, history = None, workers = None):
+        """Generator is a C++ source or a Python callable generator(args, stream)
+        writing the test to a binary stream. Python generators run on a pool
+        of `workers` processes, so the callable must be defined at module level.
+        History is an optional SQLite file where End() records run times"""
+        self.start_time = time.perf_counter()
         self.filename = filename
+        self.history = Path(history) if history else None
+        self.history_run = None
 
         self.output_dir = output_dir
         if os.path.exists(self.output_dir):
@@ -23,17 +59,39 @@ class TestGen:
 
         self.tempDir = Path(tempfile.mkdtemp())
 
-        self.generator = Path(self.tempDir, "generator")
         self.solution = Path(self.tempDir, "solution")
-        compile(Path(generator), self.generator)
+        if callable(generator):
+            self.generator = generator
+            generator_source = None
+            try:
+                generator_source = inspect.getsourcefile(
+                    generator.func if isinstance(generator, functools.partial) else generator)
+            except TypeError:
+                pass # Callable objects without a Python source file
+            self.sources = {'generator': Path(generator_source) if generator_source else None,
+                            'solution': Path(solution)}
+        else:
+            self.generator = Path(self.tempDir, "generator")
+            self.sources = {'generator': Path(generator), 'solution': Path(solution)}
+            compile(Path(generator), self.generator)
         compile(Path(solution), self.solution)
+        self.workers = workers
+        self.pool = None
+        self.optimized_solution = None # -O2 build used by SearchWorstCase
+        self.pending = {} # test_id -> future of a Python generator test
+        self.compile_time = time.perf_counter() - self.start_time
 
         self.test_group = -1
         self.test_in_group = 0
         self.group_list = []
         self.test_list = []
+        self.test_info = {} # test_id -> manifest entry
 
     def End(self):
+        self.WaitForTests()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
         print("Summary:")
         cnt = -1
         points = 0
@@ -44,6 +102,26 @@ class TestGen:
         print(f"TOTAL POINTS: {points}")
         assert(points == 100)
         shutil.rmtree(self.tempDir)
+        if self.history:
+            self.RecordHistory()
+
+    def RecordHistory(self):
+        tests = [self.test_info[test] for test in self.test_list]
+        phases = {
+            'compile': self.compile_time,
+            'generation': sum(test['generation_time'] for test in tests),
+            'solve': sum(test['solve_time'] for test in tests),
+            'total': time.perf_counter() - self.start_time,
+        }
+        test_times = {test['input']['name']: {'generation_time': test['generation_time'],
+                                              'solution_time': test['solve_time']}
+                      for test in tests}
+        test_bytes = sum(test['input']['size'] + test['output']['size'] for test in tests)
+        history = History(self.history)
+        self.history_run = history.record_run("testgen", self.filename, source_hashes(self.sources),
+                                              phases, test_times, test_bytes=test_bytes)
+        history.close()
+        print(f"Run recorded in {self.history}")
 
     def NewGroup(self, points, comment = "", public = False):
         if comment is None:
@@ -72,34 +150,79 @@ class TestGen:
 
     def GenerateAnswer(self, input:Path, output:Path):
         print(f"Generating answer {output}")
+        start = time.perf_counter()
         with input.open('r') as finp:
             with output.open('w') as fout:
                 subprocess.run([self.solution.absolute()], stdin = finp, stdout = fout,
                                stderr = sys.stdout.buffer) \
                     .check_returncode()
+        return time.perf_counter() - start
 
     def StoreTest(self):
         self.test_list.append((self.test_group, self.test_in_group))
 
+    def RecordTest(self, source, args, generation_time, solve_time, test_id = None):
+        test_id = test_id if test_id else (self.test_group, self.test_in_group)
+        self.test_info[test_id] = {
+            'id': self.GetExtension(True, test_id)[2:],
+            'group': test_id[0],
+            'index': test_id[1],
+            'source': source,
+            'args': args,
+            'generation_time': generation_time,
+            'solve_time': solve_time,
+            'input': dict(name=self.GetInputFile(test_id).name,
+                          **manifest.describe_file(self.GetInputFile(test_id))),
+            'output': dict(name=self.GetOutputFile(test_id).name,
+                           **manifest.describe_file(self.GetOutputFile(test_id))),
+        }
+
     def GenerateTest(self, args):
+        if callable(self.generator):
+            self.GeneratePythonTest(args)
+            return
         self.StoreTest()
         args = [str(arg) for arg in args]
         input = self.GetInputFile()
         print(f"Generating test {input} , args: {args}")
         output = self.GetOutputFile()
+        start = time.perf_counter()
         with input.open('w') as finp:
             subprocess.run([str(self.generator)] + args, stdout = finp)\
                 .check_returncode()
-        self.GenerateAnswer(input, output)
+        generation_time = time.perf_counter() - start
+        solve_time = self.GenerateAnswer(input, output)
+        self.RecordTest("generator", args, generation_time, solve_time)
         self.IncreaseTest()
 
+    def GeneratePythonTest(self, args):
+        self.StoreTest()
+        input = self.GetInputFile()
+        print(f"Generating test {input} , args: {[str(arg) for arg in args]}")
+        if self.pool is None:
+            # Forked workers do not re-import the generation script's __main__
+            self.pool = ProcessPoolExecutor(max_workers = self.workers,
+                                            mp_context = multiprocessing.get_context('fork'))
+        test_id = (self.test_group, self.test_in_group)
+        self.pending[test_id] = (args, self.pool.submit(
+            RunPythonGenerator, self.generator, args, input, self.GetOutputFile(), self.solution))
+        self.IncreaseTest()
+
+    def WaitForTests(self):
+        """Waits for tests submitted to the Python generator pool"""
+        for test_id, (args, future) in self.pending.items():
+            generation_time, solve_time = future.result()
+            self.RecordTest("generator", [str(arg) for arg in args], generation_time, solve_time, test_id)
+        self.pending = {}
+
     def GenerateRawTest(self, rawFile):
         self.StoreTest()
         input = self.GetInputFile()
         print(f"Raw test {input}")
         output = self.GetOutputFile()
         input.write_text(rawFile)
-        self.GenerateAnswer(input, output)
+        solve_time = self.GenerateAnswer(input, output)
+        self.RecordTest("raw", None, 0.0, solve_time)
         self.IncreaseTest()
 
     def CopyRawTest(self, path):
@@ -107,9 +230,26 @@ class TestGen:
         path = Path(path)
         input = self.GetInputFile()
         input.write_bytes(path.read_bytes())
-        self.GenerateAnswer(input, self.GetOutputFile())
+        solve_time = self.GenerateAnswer(input, self.GetOutputFile())
+        self.RecordTest("copy", [str(path)], 0.0, solve_time)
         self.IncreaseTest()
 
+    def SearchWorstCase(self, space, iterations = 100, strategy = "hill", top = 5,
+                        workers = None, seed = None, repeats = 1):
+        """Searches generator arguments maximizing the solution CPU time.
+        Space is a GenerateTest argument list where worst_case.IntRange and
+        worst_case.Choice entries are searched. Returns [(seconds, args)]."""
+        print(f"Searching worst case for {space}")
+        if self.optimized_solution is None:
+            # Candidates are ranked on the build validator.py runs, not the -g one
+            self.optimized_solution = Path(self.tempDir, "solution_optimized")
+            asyncio.run(utility.compile_solution(self.sources['solution'], self.optimized_solution))
+        search = WorstCaseSearch(self.generator, self.optimized_solution, space,
+                                 Path(self.tempDir, "worst_case"), workers, seed, repeats)
+        search.search(iterations, strategy)
+        search.print_summary(top)
+        return search.slowest(top)
+
     def GeneratePointFile(self, pointFilePath:Path):
         lines = [] # (sgroup, egroup, points, comments)
         group_count = -1
@@ -133,7 +273,20 @@ class TestGen:
                 grp = self.group_list[test[0]]
                 print(f"{cnt:8}\t{test[0]:5} {test[1]:5} {grp[0]:8}\t{grp[1]}", file = f)
 
+    def GenerateManifest(self, output:Path):
+        self.WaitForTests()
+        groups = [{'group': gid, 'points': ginfo[0], 'comment': ginfo[1]}
+                  for gid, ginfo in enumerate(self.group_list)]
+        manifest.write_manifest(output, {
+            'version': manifest.MANIFEST_VERSION,
+            'filename': self.filename,
+            'groups': groups,
+            'tests': [self.test_info[test] for test in self.test_list],
+        })
+        print(f"Manifest {output} generated.")
+
     def GenerateTestZip(self, output:Path, include_output=True):
+        self.WaitForTests()
         with zipfile.ZipFile(output, 'w') as zipf:
             for test in self.test_list:
                 input_file = self.GetInputFile(test)
@@ -142,4 +295,8 @@ class TestGen:
                     output_file = self.GetOutputFile(test)
                     zipf.write(output_file, output_file.name)
         print(f"Zipfile {output} generated{' without output files' if not include_output else ''}.")
+        if self.history_run is not None:
+            history = History(self.history)
+            history.set_archive_size(self.history_run, Path(output).stat().st_size)
+            history.close()
 
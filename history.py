@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sqlite3
+import time
+
+from colorama import Fore, Style, init
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import manifest
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    task TEXT NOT NULL,
+    started REAL NOT NULL,
+    sources TEXT NOT NULL,
+    archive_size INTEGER,
+    test_bytes INTEGER
+);
+CREATE TABLE IF NOT EXISTS phases (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    phase TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS test_times (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    test TEXT NOT NULL,
+    generation_time REAL,
+    solution_time REAL,
+    validator_time REAL
+);
+CREATE INDEX IF NOT EXISTS runs_task ON runs(task, kind, id);
+CREATE INDEX IF NOT EXISTS phases_run ON phases(run_id);
+CREATE INDEX IF NOT EXISTS test_times_run ON test_times(run_id);
+"""
+
+TIME_COLUMNS = ('generation_time', 'solution_time', 'validator_time')
+
+# Slowdowns below this many seconds are considered noise
+MIN_REGRESSION_SECONDS = 0.05
+
+TestTimes = Dict[str, Dict[str, Optional[float]]]
+
+
+def source_hashes(sources: Dict[str, Optional[Path]]) -> Dict[str, str]:
+    return {name: manifest.file_digest(path)[:16]
+            for name, path in sources.items() if path is not None and path.exists()}
+
+
+class History:
+    """Local SQLite store of per-run timings of validator.py and TestGen"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def record_run(self, kind: str, task: str, sources: Dict[str, str],
+                   phases: Dict[str, float], test_times: TestTimes,
+                   archive_size: Optional[int] = None, test_bytes: Optional[int] = None) -> int:
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO runs (kind, task, started, sources, archive_size, test_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, task, time.time(), json.dumps(sources, sort_keys=True), archive_size, test_bytes))
+            run_id = cursor.lastrowid
+            self.db.executemany("INSERT INTO phases (run_id, phase, duration) VALUES (?, ?, ?)",
+                                [(run_id, phase, duration) for phase, duration in phases.items()])
+            self.db.executemany(
+                "INSERT INTO test_times (run_id, test, generation_time, solution_time, validator_time) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(run_id, test, *(times.get(column) for column in TIME_COLUMNS))
+                 for test, times in test_times.items()])
+        return run_id
+
+    def set_archive_size(self, run_id: int, archive_size: int):
+        with self.db:
+            self.db.execute("UPDATE runs SET archive_size = ? WHERE id = ?", (archive_size, run_id))
+
+    def runs(self, task: Optional[str] = None) -> List[Tuple]:
+        query = "SELECT id, kind, task, started, sources, archive_size, test_bytes FROM runs"
+        if task is not None:
+            return self.db.execute(query + " WHERE task = ? ORDER BY id", (task,)).fetchall()
+        return self.db.execute(query + " ORDER BY id").fetchall()
+
+    def phases(self, run_id: int) -> Dict[str, float]:
+        return dict(self.db.execute("SELECT phase, duration FROM phases WHERE run_id = ?", (run_id,)))
+
+    def test_times(self, run_id: int) -> TestTimes:
+        rows = self.db.execute(
+            "SELECT test, generation_time, solution_time, validator_time FROM test_times WHERE run_id = ?",
+            (run_id,))
+        return {row[0]: dict(zip(TIME_COLUMNS, row[1:])) for row in rows}
+
+
+def total(test_times: TestTimes, column: str) -> Optional[float]:
+    values = [times[column] for times in test_times.values() if times.get(column) is not None]
+    return sum(values) if values else None
+
+
+def slower(old: Optional[float], new: Optional[float], threshold: float) -> bool:
+    if old is None or new is None:
+        return False
+    return new - old > MIN_REGRESSION_SECONDS and new > old * (1 + threshold)
+
+
+def find_regressions(history: History, previous: Tuple, current: Tuple, threshold: float) -> List[str]:
+    regressions = []
+    old_phases = history.phases(previous[0])
+    for phase, duration in history.phases(current[0]).items():
+        if slower(old_phases.get(phase), duration, threshold):
+            regressions.append(f"phase {phase}: {old_phases[phase]:.2f}s -> {duration:.2f}s")
+
+    old_times = history.test_times(previous[0])
+    new_times = history.test_times(current[0])
+    for column in TIME_COLUMNS:
+        old_total = total(old_times, column)
+        new_total = total(new_times, column)
+        if slower(old_total, new_total, threshold):
+            regressions.append(f"total {column}: {old_total:.2f}s -> {new_total:.2f}s")
+        for test in sorted(new_times.keys() & old_times.keys()):
+            if slower(old_times[test].get(column), new_times[test].get(column), threshold):
+                regressions.append(f"{test} {column}: {old_times[test][column]:.3f}s -> "
+                                   f"{new_times[test][column]:.3f}s")
+
+    for idx, name in ((5, 'archive size'), (6, 'test bytes')):
+        if previous[idx] and current[idx] and current[idx] > previous[idx] * (1 + threshold):
+            regressions.append(f"{name}: {previous[idx]} -> {current[idx]}")
+    return regressions
+
+
+def print_report(history: History, task: Optional[str], last: int, threshold: float):
+    series: Dict[Tuple[str, str], List[Tuple]] = {}
+    for run in history.runs(task):
+        series.setdefault((run[2], run[1]), []).append(run)
+
+    for (task_name, kind), runs in sorted(series.items()):
+        print(Fore.YELLOW + f"{task_name} ({kind})" + Style.RESET_ALL)
+        print(f"\t{'Run':>5} {'Date':19} {'Solution':>9} {'Validator':>9} {'Generation':>10} "
+              f"{'Total':>8} {'Archive':>10}  Sources")
+        previous_sources: Optional[Dict[str, str]] = None
+        for run in runs[-last:]:
+            test_times = history.test_times(run[0])
+            sources = json.loads(run[4])
+            changed = [name for name, digest in sources.items()
+                       if previous_sources is not None and previous_sources.get(name) != digest]
+            previous_sources = sources
+            columns = [total(test_times, column) for column in ('solution_time', 'validator_time', 'generation_time')]
+            # Wall time of the run, phases themselves overlap
+            run_total = history.phases(run[0]).get('total')
+            print(f"\t{run[0]:5} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run[3]))} "
+                  + ' '.join(f"{value:9.2f}s" if value is not None else f"{'-':>10}" for value in columns)
+                  + (f" {run_total:7.2f}s" if run_total is not None else f" {'-':>8}")
+                  + f" {run[5] if run[5] else '-':>10}"
+                  + f"  {'changed: ' + ', '.join(changed) if changed else ''}")
+
+        if len(runs) >= 2:
+            regressions = find_regressions(history, runs[-2], runs[-1], threshold)
+            for regression in regressions:
+                print(Fore.RED + f"\tREGRESSION {regression}" + Style.RESET_ALL)
+            if not regressions:
+                print(Fore.GREEN + "\tNo regressions against the previous run" + Style.RESET_ALL)
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show run time trends stored by validator.py and TestGen")
+    parser.add_argument("--db", type=str, default=str(Path('testi_validator', 'history.sqlite')))
+    parser.add_argument("--task", type=str, default=None)
+    parser.add_argument("--last", type=int, default=10, help="Runs shown per task")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as regression")
+    opts = parser.parse_args()
+    init()
+    print_report(History(Path(opts.db)), opts.task, opts.last, opts.threshold)
@@ -0,0 +1,332 @@
+import re
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Bytes parsed at once, bounds the temporary arrays of a single chunk
+CHUNK_SIZE = 1 << 22
+# Longest integer token, 19 digit tokens are checked against the int64 limits
+MAX_DIGITS = 19
+INT64_MAX_DIGITS = b"9223372036854775807"
+INT64_MIN_DIGITS = b"9223372036854775808"
+
+SPACE = ord(' ')
+NEWLINE = ord('\n')
+MINUS = ord('-')
+ZERO = ord('0')
+NINE = ord('9')
+
+ITEM = re.compile(r"^([A-Za-z_]\w*)(?:\[(\w+)\])?$")
+
+
+class InputFormatError(Exception):
+    pass
+
+
+class Item:
+    def __init__(self, name: str, count: Optional[str]):
+        self.name = name
+        self.count = count  # None for scalars
+
+    @staticmethod
+    def parse(text: str) -> 'Item':
+        match = ITEM.match(text)
+        if not match:
+            raise Exception(f"Bad input_format item '{text}'")
+        return Item(match.group(1), match.group(2))
+
+
+class Line:
+    """One input line, or `repeat` lines of scalar items when repeat is set"""
+
+    def __init__(self, items: List[Item], repeat: Optional[str] = None):
+        self.items = items
+        self.repeat = repeat
+        if repeat is not None and any(item.count is not None for item in items):
+            raise Exception("Repeated input_format lines may contain only scalars")
+
+    @staticmethod
+    def parse(config: Union[str, Dict[str, Any]]) -> 'Line':
+        if isinstance(config, dict):
+            return Line([Item.parse(item) for item in str(config['line']).split()],
+                        str(config['repeat']))
+        return Line([Item.parse(item) for item in str(config).split()])
+
+
+Bounds = Dict[str, Tuple[Optional[int], Optional[int]]]
+
+
+def parse_bounds(config: Dict[str, Any]) -> Bounds:
+    return {name: (bounds[0], bounds[1]) for name, bounds in config.items()}
+
+
+class InputSpec:
+    """Declarative input format from the 'input_format' section of task.yaml:
+
+        input_format:
+          lines:
+            - N M
+            - A[N]
+            - {repeat: M, line: U V}
+          constraints:
+            N: [1, 200000]
+            A: [1, 1000000000]
+          subtasks:
+            1: {N: [1, 1000]}
+
+    Tokens are integers separated by single spaces, every line ends with a
+    newline. A line of arrays without elements may be empty or left out.
+    Subtask constraints override the general ones.
+    """
+
+    def __init__(self, lines: List[Line], constraints: Bounds, subtasks: Dict[int, Bounds]):
+        self.lines = lines
+        self.constraints = constraints
+        self.subtasks = subtasks
+        names = {item.name for line in lines for item in line.items}
+        for bounds in [constraints] + list(subtasks.values()):
+            for name in bounds:
+                if name not in names:
+                    raise Exception(f"Constraint on unknown input_format variable {name}")
+
+    @staticmethod
+    def from_config(config: Dict[str, Any]) -> 'InputSpec':
+        return InputSpec([Line.parse(line) for line in config['lines']],
+                         parse_bounds(config.get('constraints', {})),
+                         {int(subtask): parse_bounds(bounds)
+                          for subtask, bounds in config.get('subtasks', {}).items()})
+
+    def read(self, file: Path) -> Dict[str, Optional[Tuple[int, int]]]:
+        """Checks the file structure and returns the (min, max) value of every
+        variable, None for empty arrays. Holds at most one chunk of the file in memory."""
+        reader = TokenReader(file)
+        scalars: Dict[str, int] = {}
+        ranges: Dict[str, Optional[Tuple[int, int]]] = {}
+
+        def resolve(count: str) -> int:
+            value = int(count) if count.isdigit() else scalars.get(count)
+            if value is None:
+                raise Exception(f"input_format count {count} is not a scalar read before")
+            if value < 0 or value > reader.remaining_bound():
+                raise InputFormatError(f"Count {count}={value} out of range")
+            return value
+
+        for line in self.lines:
+            # (name, first column, end column) of every item within a row
+            segments = []
+            if line.repeat is not None:
+                rows = resolve(line.repeat)
+                segments = [(item.name, column, column + 1) for column, item in enumerate(line.items)]
+            else:
+                rows = 1
+                for item in line.items:
+                    column = segments[-1][2] if segments else 0
+                    segments.append((item.name, column, column + (1 if item.count is None else resolve(item.count))))
+            width = segments[-1][2] if segments else 0
+            for name, _, _ in segments:
+                ranges[name] = None
+            if line.repeat is None and width == 0:
+                # Line of empty arrays, may be written as an empty line
+                reader.skip_empty_line()
+
+            first = reader.consumed
+            done = 0
+            for values, separators in reader.take(rows * width):
+                columns = (done + np.arange(len(values))) % width
+                if not (separators == np.where(columns == width - 1, NEWLINE, SPACE)).all():
+                    raise InputFormatError(f"Bad line structure near token {first}, expected {line_text(line)}")
+                for name, low, high in segments:
+                    selected = values[(columns >= low) & (columns < high)] if len(segments) > 1 else values
+                    if len(selected) == 0:
+                        continue
+                    low_value, high_value = int(selected.min()), int(selected.max())
+                    if ranges[name] is not None:
+                        low_value = min(low_value, ranges[name][0])
+                        high_value = max(high_value, ranges[name][1])
+                    ranges[name] = (low_value, high_value)
+                done += len(values)
+
+            if line.repeat is None:
+                for item in line.items:
+                    if item.count is None:
+                        scalars[item.name] = ranges[item.name][0]
+
+        if not reader.at_end():
+            raise InputFormatError(f"Unexpected data after token {reader.consumed}")
+        return ranges
+
+    def matching_subtasks(self, file: Path, subtasks: Iterable[int]) -> Set[int]:
+        try:
+            ranges = self.read(file)
+        except InputFormatError as e:
+            print(f"\t{file} : {e}")
+            return set()
+        return {subtask for subtask in subtasks
+                if satisfies(ranges, {**self.constraints, **self.subtasks.get(subtask, {})})}
+
+
+def line_text(line: Line) -> str:
+    text = ' '.join(item.name if item.count is None else f"{item.name}[{item.count}]"
+                    for item in line.items)
+    return f"{line.repeat} x '{text}'" if line.repeat is not None else f"'{text}'"
+
+
+def satisfies(ranges: Dict[str, Optional[Tuple[int, int]]], bounds: Bounds) -> bool:
+    for name, (low, high) in bounds.items():
+        value = ranges.get(name)
+        if value is None:
+            continue
+        if low is not None and value[0] < low:
+            return False
+        if high is not None and value[1] > high:
+            return False
+    return True
+
+
+class TokenReader:
+    """Integer tokens of the file and the separator following each, parsed one chunk at a time"""
+
+    def __init__(self, file: Path):
+        if np is None:
+            raise Exception("NumPy is required for input_format checks")
+        self.size = file.stat().st_size
+        if self.size == 0:
+            raise InputFormatError("Empty file")
+        self.data = np.memmap(file, dtype=np.uint8, mode='r')
+        if self.data[-1] != NEWLINE:
+            raise InputFormatError("File does not end with a newline")
+        self.start = 0  # First byte not parsed yet
+        self.values = np.empty(0, dtype=np.int64)
+        self.separators = np.empty(0, dtype=np.uint8)
+        self.empty_lines = np.empty(0, dtype=bool)
+        self.position = 0  # Next token within the current chunk
+        self.consumed = 0  # Integer tokens read, empty lines are not counted
+
+    def next_chunk(self) -> bool:
+        if self.start >= self.size:
+            return False
+        end = min(self.size, self.start + CHUNK_SIZE)
+        if end < self.size:
+            # Cut right after the last separator, so tokens are not split
+            chunk_separators = np.flatnonzero((self.data[self.start:end] == SPACE) |
+                                              (self.data[self.start:end] == NEWLINE))
+            if len(chunk_separators) == 0:
+                raise InputFormatError(f"Token longer than {CHUNK_SIZE} bytes")
+            end = self.start + int(chunk_separators[-1]) + 1
+        previous = int(self.data[self.start - 1]) if self.start > 0 else NEWLINE
+        self.values, self.separators, self.empty_lines = parse_chunk(
+            np.asarray(self.data[self.start:end]), self.start, previous)
+        self.position = 0
+        self.start = end
+        return True
+
+    def remaining_bound(self) -> int:
+        """Upper bound of the unread tokens, every token takes at least two bytes"""
+        return len(self.values) - self.position + (self.size - self.start) // 2
+
+    def skip_empty_line(self) -> bool:
+        if self.position == len(self.values) and not self.next_chunk():
+            return False
+        if not self.empty_lines[self.position]:
+            return False
+        self.position += 1
+        return True
+
+    def take(self, count: int):
+        """Yields (values, separators) pieces of the next `count` integer tokens"""
+        while count > 0:
+            if self.position == len(self.values) and not self.next_chunk():
+                raise InputFormatError("Unexpected end of file")
+            end = min(len(self.values), self.position + count)
+            empty_lines = np.flatnonzero(self.empty_lines[self.position:end])
+            if len(empty_lines):
+                raise InputFormatError(f"Unexpected empty line after token {self.consumed + int(empty_lines[0])}")
+            yield self.values[self.position:end], self.separators[self.position:end]
+            count -= end - self.position
+            self.consumed += end - self.position
+            self.position = end
+
+    def at_end(self) -> bool:
+        return self.position == len(self.values) and self.start >= self.size
+
+
+def first(mask) -> int:
+    return int(np.flatnonzero(mask)[0])
+
+
+def overflows(chunk, digit_starts, negative):
+    """Compares MAX_DIGITS long tokens with the int64 limits digit by digit,
+    returns which of them do not fit"""
+    digits = chunk[digit_starts[:, None] + np.arange(MAX_DIGITS)]
+    limits = np.where(negative[:, None],
+                      np.frombuffer(INT64_MIN_DIGITS, dtype=np.uint8),
+                      np.frombuffer(INT64_MAX_DIGITS, dtype=np.uint8))
+    differs = digits != limits
+    first_difference = differs.argmax(axis=1)
+    rows = np.arange(len(digits))
+    return differs.any(axis=1) & (digits[rows, first_difference] > limits[rows, first_difference])
+
+
+def parse_chunk(chunk, offset: int, previous: int):
+    """Chunk starts with a token or an empty line and ends with a separator,
+    `previous` is the byte before it. Returns the token values, the separator
+    after each token and which tokens are empty lines, those have value 0."""
+    is_separator = (chunk == SPACE) | (chunk == NEWLINE)
+    is_digit = (chunk >= ZERO) & (chunk <= NINE)
+    is_minus = chunk == MINUS
+    allowed = is_separator | is_digit | is_minus
+    if not allowed.all():
+        bad = first(~allowed)
+        raise InputFormatError(f"Unexpected byte {int(chunk[bad])} at byte {offset + bad}")
+    before = np.concatenate(([previous], chunk[:-1]))
+    is_empty_line = (chunk == NEWLINE) & (before == NEWLINE)
+    extra = is_separator & ((before == SPACE) | (before == NEWLINE)) & ~is_empty_line
+    if extra.any():
+        raise InputFormatError(f"Extra whitespace at byte {offset + first(extra)}")
+
+    all_ends = np.flatnonzero(is_separator)
+    empty_lines = is_empty_line[all_ends]
+    values = np.zeros(len(all_ends), dtype=np.int64)
+    # Every integer token starts right after the previous separator
+    ends = all_ends[~empty_lines]
+    starts = np.concatenate(([0], all_ends[:-1] + 1))[~empty_lines]
+    if len(ends) == 0:
+        return values, chunk[all_ends], empty_lines
+
+    negative = is_minus[starts]
+    digit_starts = starts + negative
+    lengths = ends - digit_starts
+    misplaced_minus = is_minus.copy()
+    misplaced_minus[starts[negative]] = False
+    if misplaced_minus.any():
+        raise InputFormatError(f"Misplaced '-' at byte {offset + first(misplaced_minus)}")
+    if (lengths == 0).any():
+        raise InputFormatError(f"Misplaced '-' at byte {offset + int(starts[first(lengths == 0)])}")
+    if (lengths > MAX_DIGITS).any():
+        raise InputFormatError(f"Integer longer than {MAX_DIGITS} digits at byte "
+                               f"{offset + int(starts[first(lengths > MAX_DIGITS)])}")
+    leading_zero = (chunk[digit_starts] == ZERO) & ((lengths > 1) | negative)
+    if leading_zero.any():
+        raise InputFormatError(f"Leading zero or '-0' at byte {offset + int(starts[first(leading_zero)])}")
+    longest = np.flatnonzero(lengths == MAX_DIGITS)
+    if len(longest):
+        overflowing = overflows(chunk, digit_starts[longest], negative[longest])
+        if overflowing.any():
+            raise InputFormatError(f"Integer does not fit in int64 at byte "
+                                   f"{offset + int(starts[longest[first(overflowing)]])}")
+
+    # Digits of each token are contiguous, weight them by their distance to the token end
+    digit_positions = np.flatnonzero(is_digit)
+    exponents = np.repeat(ends, lengths) - 1 - digit_positions
+    powers = 10 ** np.arange(MAX_DIGITS, dtype=np.int64)
+    contributions = (chunk[digit_positions] - ZERO).astype(np.int64) * powers[exponents]
+    token_offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    token_values = np.add.reduceat(contributions, token_offsets)
+    token_values[negative] = -token_values[negative]
+    values[~empty_lines] = token_values
+    return values, chunk[all_ends], empty_lines
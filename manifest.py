@@ -0,0 +1,113 @@
+import hashlib
+import json
+import re
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+# file name -> [size, mtime_ns, sha256] of the last hashed version
+HashCache = Dict[str, List]
+
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_digest(path: Path, hash_cache: HashCache) -> str:
+    """Hashes the file only if its size or modification time changed since it was cached"""
+    stat = path.stat()
+    entry = hash_cache.get(path.name)
+    if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+        return entry[2]
+    digest = file_digest(path)
+    hash_cache[path.name] = [stat.st_size, stat.st_mtime_ns, digest]
+    return digest
+
+
+def load_hash_cache(path: Path) -> HashCache:
+    if not path.exists():
+        return {}
+    with path.open() as f:
+        return json.load(f)
+
+
+def write_hash_cache(path: Path, hash_cache: HashCache):
+    with path.open('w') as f:
+        json.dump(hash_cache, f)
+
+
+def describe_file(path: Path) -> Dict[str, Any]:
+    return {'size': path.stat().st_size, 'sha256': file_digest(path)}
+
+
+def write_manifest(path: Path, manifest: Dict[str, Any]):
+    with path.open('w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load_manifest(path: Path) -> Dict[str, Any]:
+    print(f"Reading manifest {path}")
+    with path.open() as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise Exception(f"Unsupported manifest version {manifest.get('version')} in {path}")
+    return manifest
+
+
+def get_manifest_files(manifest: Dict[str, Any], test_dir: Path) -> Dict[int, Dict[str, Path]]:
+    """Same layout as test_units.get_input_files, without scanning test_dir"""
+    test_files: Dict[int, Dict[str, Path]] = {}
+    matcher = re.compile(r"^\d+([a-z]*)$")
+    for test in manifest['tests']:
+        match = matcher.match(test['id'])
+        if not match:
+            raise Exception(f"Bad test id {test['id']} in manifest")
+        group_files = test_files.setdefault(test['group'], {})
+        if match.group(1) in group_files:
+            raise Exception(f"Duplicated test {test['id']} in manifest")
+        group_files[match.group(1)] = test_dir.joinpath(test['input']['name'])
+    return test_files
+
+
+def verify_manifest(manifest: Dict[str, Any], test_dir: Path,
+                    hash_cache: Optional[HashCache] = None) -> List[str]:
+    """Returns problems found comparing test_dir against the manifest.
+    Files whose size and mtime match `hash_cache` are not hashed again,
+    the cache is updated with every hashed file."""
+    hash_cache = {} if hash_cache is None else hash_cache
+    problems = []
+    listed = set()
+    for test in manifest['tests']:
+        for kind in ('input', 'output'):
+            entry = test.get(kind)
+            if entry is None:
+                continue
+            listed.add(entry['name'])
+            path = test_dir.joinpath(entry['name'])
+            if not path.exists():
+                problems.append(f"{path} is missing")
+            elif path.stat().st_size != entry['size']:
+                problems.append(f"{path} size {path.stat().st_size} != {entry['size']}")
+            elif cached_digest(path, hash_cache) != entry['sha256']:
+                problems.append(f"{path} content hash differs")
+    for path in sorted(test_dir.iterdir()):
+        if path.name not in listed:
+            problems.append(f"{path} is not listed in the manifest")
+    return problems
+
+
+def diff_manifests(old: Dict[str, Any], new: Dict[str, Any]) -> Set[str]:
+    """Ids of tests added, removed or changed between two manifests"""
+    def fingerprint(test):
+        return tuple((test.get(kind) or {}).get('sha256') for kind in ('input', 'output'))
+    old_tests = {test['id']: fingerprint(test) for test in old['tests']}
+    new_tests = {test['id']: fingerprint(test) for test in new['tests']}
+    return {tid for tid in old_tests.keys() | new_tests.keys()
+            if old_tests.get(tid) != new_tests.get(tid)}
@@ -7,6 +7,7 @@ from colorama import Fore, Back, Style
 from pathlib import Path
 from typing import Union, List, Optional
 from test_assignment import TestAssignment
+from input_spec import InputSpec
 
 class Unit:
     pass
@@ -14,7 +15,9 @@ class Unit:
 class Task(Unit):
     def __init__(self, name: str, title: str, public_groups: List[int],
                  test_archive: Path, validator: Path, point_file: Path,
-                 subtask_points: List[int]):
+                 subtask_points: List[int], solution: Optional[Path] = None,
+                 validator_batch: bool = False, validator_subtasks: bool = False,
+                 manifest: Optional[Path] = None, input_spec: Optional[InputSpec] = None):
         self.name = name
         self.title = title
         self.public_groups = public_groups
@@ -22,6 +25,11 @@ class Task(Unit):
         self.validator = validator
         self.point_file = point_file
         self.subtask_points = subtask_points
+        self.solution = solution
+        self.validator_batch = validator_batch
+        self.validator_subtasks = validator_subtasks
+        self.manifest = manifest
+        self.input_spec = input_spec
 
     def print_summary(self):
         text = f"Task: {self.name}: {self.title}"
@@ -79,5 +87,11 @@ def load_task(config_path: Path) -> Task:
     validator = task_dir.joinpath(config.get('validator', 'riki/validator.cpp'))
     point_file = task_dir.joinpath(config.get('point_file', 'punkti.txt'))
     subtask_points = config.get('subtask_points', [0, 2])
+    solution = task_dir.joinpath(config['solution']) if 'solution' in config else None
+    validator_batch = config.get('validator_batch', False)
+    validator_subtasks = config.get('validator_subtasks', False)
+    manifest = task_dir.joinpath(config['manifest']) if 'manifest' in config else None
+    input_spec = InputSpec.from_config(config['input_format']) if 'input_format' in config else None
     return Task(config['name'], config['title'], public_groups, test_archive,
-                validator, point_file, subtask_points)
+                validator, point_file, subtask_points, solution, validator_batch,
+                validator_subtasks, manifest, input_spec)
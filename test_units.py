@@ -1,18 +1,44 @@
 import asyncio
 import utility
+import manifest
+from input_spec import InputSpec
 import shutil
 import shlex
+import random
+import time
 import re
 
 from pathlib import Path
-from typing import Iterable, List, Dict, Set
+from typing import Iterable, List, Dict, Set, Tuple, Union, Optional
+
+# Most tests sent to a batch validator at once. Chunks start with a single test
+# and double, so a subtask failing early costs about as much as without --batch
+MAX_BATCH_CHUNK = 64
 
 class Test:
     def __init__(self, tid: str, file: Path):
         self.tid = tid
         self.file = file
+        self.answer = get_answer_file(file)
+        # Validator verdicts, reused when the test is validated again
+        self.verdicts: Dict[int, bool] = {}
+        self.all_matches: Optional[Set[int]] = None
+        # Wall time spent validating this test, None if not measured
+        self.validator_time: Optional[float] = None
+
+    def add_validator_time(self, start: float):
+        self.add_validator_duration(time.perf_counter() - start)
+
+    def add_validator_duration(self, duration: float):
+        self.validator_time = (self.validator_time or 0.0) + duration
 
     async def validate(self, validator: Path, subtask: int):
+        if subtask not in self.verdicts:
+            self.verdicts[subtask] = await self.run_validator(validator, subtask)
+        return self.verdicts[subtask]
+
+    async def run_validator(self, validator: Path, subtask: int):
+        start = time.perf_counter()
         try:
             await utility.shell([shlex.quote(str(validator)), '--group', str(subtask), 
                                  '<', shlex.quote(str(self.file))])
@@ -21,6 +47,108 @@ class Test:
         except utility.NonZeroReturnCode:
             print(f"\t{self.file} : {subtask:3}")
             return False
+        finally:
+            self.add_validator_time(start)
+
+    async def match_all(self, validator: Path, subtask_count: int) -> Set[int]:
+        if self.all_matches is not None:
+            return self.all_matches
+        start = time.perf_counter()
+        try:
+            output = await utility.run_output([str(validator), '--subtasks', str(subtask_count)],
+                                              self.file)
+            matches = parse_subtask_list(output)
+        except utility.NonZeroReturnCode:
+            matches = set()
+        self.add_validator_time(start)
+        print(f"\t{self.file} : {sorted(matches)}")
+        self.all_matches = matches
+        return matches
+
+    async def match_spec(self, spec: InputSpec, subtasks: Set[int]) -> Set[int]:
+        if self.all_matches is None:
+            loop = asyncio.get_event_loop()
+            start = time.perf_counter()
+            self.all_matches = await loop.run_in_executor(None, spec.matching_subtasks, self.file, subtasks)
+            self.add_validator_time(start)
+            print(f"\t{self.file} : {sorted(self.all_matches)}")
+        return self.all_matches
+
+    def size(self) -> int:
+        return self.file.stat().st_size
+
+
+class BatchValidator:
+    """Keeps a single validator process running in --batch mode (see
+    testgen_validator.h) and feeds it (file, subtask) jobs."""
+
+    def __init__(self, validator: Path, subtask_count: Optional[int] = None):
+        self.validator = validator
+        self.subtask_count = subtask_count
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.lock = asyncio.Lock()
+
+    async def start(self):
+        args = [str(self.validator), '--batch']
+        if self.subtask_count is not None:
+            args += ['--subtasks', str(self.subtask_count)]
+        self.proc = await asyncio.create_subprocess_exec(
+            *args, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+
+    async def close(self):
+        assert self.proc is not None
+        self.proc.stdin.close()
+        await self.proc.wait()
+        if self.proc.returncode != 0:
+            raise utility.NonZeroReturnCode(f"Batch validator {self.validator} returned {self.proc.returncode}")
+
+    async def run_jobs(self, jobs: List[Tuple[str, Test]]) -> List[str]:
+        """Wall time of the whole batch is split evenly between its tests"""
+        assert self.proc is not None
+        proc = self.proc
+
+        async def send():
+            for subtask, test in jobs:
+                proc.stdin.write(f"{subtask} {test.file.absolute()}\n".encode())
+            await proc.stdin.drain()
+
+        async def receive() -> List[str]:
+            verdicts = []
+            for _ in jobs:
+                line = (await proc.stdout.readline()).decode().strip()
+                if not line:
+                    raise Exception(f"Batch validator {self.validator} stopped responding")
+                verdicts.append(line)
+            return verdicts
+
+        # Jobs are sent while verdicts are read, so neither pipe can fill up
+        async with self.lock:
+            start = time.perf_counter()
+            verdicts = (await asyncio.gather(send(), receive()))[1]
+            duration = time.perf_counter() - start
+        for _, test in jobs:
+            test.add_validator_duration(duration / len(jobs))
+        return verdicts
+
+    async def validate_many(self, tests: List[Test], subtask: int) -> List[bool]:
+        verdicts = await self.run_jobs([(str(subtask), test) for test in tests])
+        results = []
+        for test, verdict in zip(tests, verdicts):
+            ok = verdict == "OK"
+            print(f"\t{test.file} : {subtask:3}{'  OK!' if ok else ''}")
+            results.append(ok)
+        return results
+
+    async def match_all_many(self, tests: List[Test]) -> List[Set[int]]:
+        verdicts = await self.run_jobs([("all", test) for test in tests])
+        results = []
+        for test, verdict in zip(tests, verdicts):
+            matches = set()
+            if verdict.startswith("SUBTASKS"):
+                matches = parse_subtask_list(verdict[len("SUBTASKS"):])
+            print(f"\t{test.file} : {sorted(matches)}")
+            results.append(matches)
+        return results
 
 
 class TestGroup:
@@ -33,32 +161,110 @@ class TestGroup:
     def set_tests(self, files: Dict[str, Path]):
         self.tests = {tid: Test(tid, file) for tid, file in files.items()}
 
-    async def match_subtasks(self, validator: Path, subtask_list: Iterable[int]):
+    def sample_tests(self, count: int, rng: random.Random) -> List[Test]:
+        """Smallest and largest test of the group and `count` random others"""
+        tests = sorted(self.tests.values(), key=lambda test: (test.size(), test.tid))
+        if len(tests) <= 2:
+            return tests
+        middle = tests[1:-1]
+        return [tests[0]] + rng.sample(middle, min(count, len(middle))) + [tests[-1]]
+
+    async def match_subtasks(self, validator: Union[Path, BatchValidator, InputSpec], subtask_list: Iterable[int],
+                             all_subtasks: bool = False, tests: Optional[List[Test]] = None):
+        """Matches subtasks using all tests of the group or only the given ones"""
         if not self.tests:
             raise Exception("No tests available")
+        test_list = list(self.tests.values()) if tests is None else tests
         self.subtask_matches.clear()
+        if all_subtasks or isinstance(validator, InputSpec):
+            await self.match_all_subtasks(validator, set(subtask_list), test_list)
+            return
         for subtask in subtask_list:
+            if isinstance(validator, BatchValidator):
+                add_match = True
+                start = 0
+                chunk_size = 1
+                while start < len(test_list):
+                    chunk = test_list[start:start + chunk_size]
+                    start += chunk_size
+                    chunk_size = min(2 * chunk_size, MAX_BATCH_CHUNK)
+                    # A cached failure decides the subtask without running the rest of the chunk
+                    if any(not test.verdicts.get(subtask, True) for test in chunk):
+                        add_match = False
+                        break
+                    pending = [test for test in chunk if subtask not in test.verdicts]
+                    if pending:
+                        verdicts = await validator.validate_many(pending, subtask)
+                        for test, verdict in zip(pending, verdicts):
+                            test.verdicts[subtask] = verdict
+                    if not all(test.verdicts[subtask] for test in chunk):
+                        add_match = False
+                        break
+                if add_match:
+                    self.subtask_matches.add(subtask)
+                continue
             add_match = True
-            for test in self.tests.values():
+            for test in test_list:
                 if not (await test.validate(validator, subtask)):
                     add_match = False
                     break
             if add_match:
                 self.subtask_matches.add(subtask)
 
+    async def match_all_subtasks(self, validator: Union[Path, BatchValidator, InputSpec], subtasks: Set[int],
+                                 test_list: List[Test]):
+        """Single validator pass per test, the validator reports all matching subtasks"""
+        subtask_count = max(subtasks) + 1 if subtasks else 0
+        matches = set(subtasks)
+        if isinstance(validator, InputSpec):
+            for test in test_list:
+                matches &= await test.match_spec(validator, subtasks)
+                if not matches:
+                    break
+        elif isinstance(validator, BatchValidator):
+            pending = [test for test in test_list if test.all_matches is None]
+            for test, test_matches in zip(pending, await validator.match_all_many(pending)):
+                test.all_matches = test_matches
+            for test in test_list:
+                matches &= test.all_matches
+        else:
+            for test in test_list:
+                matches &= await test.match_all(validator, subtask_count)
+                if not matches:
+                    break
+        self.subtask_matches.update(matches)
+
 
 class Tests:
-    def __init__(self, point_file: Path, test_dir: Path, public_groups: List[int]):
+    def __init__(self, point_file: Path, test_dir: Path, public_groups: List[int],
+                 test_manifest: Optional[Dict] = None):
         assert(len(set(public_groups)) == len(public_groups))
         self.public_groups = public_groups
         self.groups = {gid: TestGroup(gid, points) for gid, points in read_points(point_file).items()}
-        input_files = get_input_files(test_dir)
+        if test_manifest is not None:
+            input_files = manifest.get_manifest_files(test_manifest, test_dir)
+        else:
+            input_files = get_input_files(test_dir)
         for gid, tests in input_files.items():
             self.groups[gid].set_tests(tests)
 
-    async def match_subtasks(self, validator: Path, subtask_list: Iterable[int]):
+    async def match_subtasks(self, validator: Union[Path, BatchValidator, InputSpec], subtask_list: Iterable[int],
+                             all_subtasks: bool = False, sample: Optional[int] = None,
+                             seed: Optional[str] = None):
+        """With `sample` only a few tests per group are validated, see TestGroup.sample_tests"""
+        rng = random.Random(seed)
         for test_group in self.groups.values():
-            await test_group.match_subtasks(validator, subtask_list)
+            tests = test_group.sample_tests(sample, rng) if sample is not None else None
+            await test_group.match_subtasks(validator, subtask_list, all_subtasks, tests)
+
+    def get_validator_times(self) -> Dict[str, float]:
+        return {test.file.name: test.validator_time
+                for group in self.groups.values() for test in group.tests.values()
+                if test.validator_time is not None}
+
+    def get_answer_pairs(self) -> List[Tuple[Path, Path]]:
+        return [(test.file, test.answer)
+                for group in self.groups.values() for test in group.tests.values()]
 
     def print_summary(self):
         total_public_points = 0
@@ -95,6 +301,15 @@ def get_input_files(test_folder :Path) -> Dict[int, Dict[str, Path]]:
     return test_files
 
 
+def parse_subtask_list(text: str) -> Set[int]:
+    return {int(subtask) for subtask in text.split()}
+
+
+def get_answer_file(input_file: Path) -> Path:
+    name = re.sub(r"\.i(\d+[a-z]*)$", r".o\1", input_file.name)
+    return input_file.with_name(name)
+
+
 def read_points(point_file: Path) -> Dict[int, int]:
     print(f"Reading point file {point_file}")
     # Parse following file
@@ -1,25 +1,43 @@
 import argparse
 import utility
 import asyncio
+import time
 
 from colorama import Fore, Back, Style
 from pathlib import Path
 from task_units import Unit, Task, Contest
 from test_assignment import TestAssignment
-from typing import Optional, List, Union, cast
-from test_units import extract_tests, Tests
+from typing import Optional, List, Set, Dict, Union, Awaitable, TypeVar, cast
+from test_units import extract_tests, Tests, BatchValidator
+from answer_check import AnswerMismatch, check_answers
+from input_spec import InputSpec
+from history import History, source_hashes
+import manifest
+
+T = TypeVar('T')
 
 class ValidationResult:
     def print_summary(self):
         raise NotImplementedError
 
+    def record_history(self, history: History):
+        raise NotImplementedError
+
 class TaskValidationResult(ValidationResult):
 
-    def __init__(self, task: Task):
+    def __init__(self, task: Task, quick: bool = False, after_quick: bool = False):
         self.state = "unresolved"
+        self.quick = quick
+        # Full stage reusing tests, validator and verdicts of a quick stage
+        self.after_quick = after_quick
         self.task: Task = task
         self.tests: Optional[Tests] = None
+        self.validator: Optional[Union[Path, InputSpec]] = None
         self.test_assignment: Optional[TestAssignment] = None
+        self.answer_mismatches: Optional[List[AnswerMismatch]] = None
+        self.changed_tests: Optional[Set[str]] = None
+        self.phases: Dict[str, float] = {}
+        self.solution_times: Dict[str, float] = {}
         self.exception: Optional[Exception] = None
 
     def set_task(self, task: Task):
@@ -28,9 +46,44 @@ class TaskValidationResult(ValidationResult):
     def set_tests(self, tests: Tests):
         self.tests = tests
 
+    def set_validator(self, validator: Union[Path, InputSpec]):
+        self.validator = validator
+
     def set_test_assignment(self, test_assignment: TestAssignment):
         self.test_assignment = test_assignment
 
+    def set_answer_mismatches(self, answer_mismatches: List[AnswerMismatch]):
+        self.answer_mismatches = answer_mismatches
+
+    def set_changed_tests(self, changed_tests: Set[str]):
+        self.changed_tests = changed_tests
+
+    def set_solution_times(self, solution_times: Dict[str, float]):
+        self.solution_times = solution_times
+
+    async def timed(self, phase: str, awaitable: Awaitable[T]) -> T:
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - start
+
+    def record_history(self, history: History):
+        sources = source_hashes({
+            'validator': None if self.task.input_spec else self.task.validator,
+            'solution': self.task.solution,
+            'point_file': self.task.point_file,
+            'archive': self.task.test_archive,
+        })
+        test_times: Dict[str, Dict[str, Optional[float]]] = {}
+        validator_times = self.tests.get_validator_times() if self.tests else {}
+        for test in validator_times.keys() | self.solution_times.keys():
+            test_times[test] = {'validator_time': validator_times.get(test),
+                                'solution_time': self.solution_times.get(test)}
+        archive_size = self.task.test_archive.stat().st_size if self.task.test_archive.exists() else None
+        kind = "quick" if self.quick else "full_after_quick" if self.after_quick else "validator"
+        history.record_run(kind, self.task.name, sources, self.phases, test_times, archive_size)
+
     def set_success(self):
         if self.state == "unresolved":
             self.state = "success"
@@ -47,13 +100,23 @@ class TaskValidationResult(ValidationResult):
         if self.tests:
             self.tests.print_summary()
 
+        if self.changed_tests is not None:
+            print(f"\tTests changed since last validation: {len(self.changed_tests)} {sorted(self.changed_tests)}")
+
         if self.test_assignment:
             self.test_assignment.print_summary()
 
-        if self.success():
+        if self.answer_mismatches is not None:
+            print(f"\tAnswer mismatches: {len(self.answer_mismatches)}")
+            for mismatch in self.answer_mismatches:
+                print(f"\t\t{mismatch}")
+
+        if self.success() and self.quick:
+            print(Fore.GREEN + "QUICK CHECK PASSED (sampled tests only)")
+        elif self.success():
             print(Fore.GREEN + "GREAT SUCCESS")
         elif self.failed():
-            print(Back.RED + "VALIDATION FAILED")
+            print(Back.RED + ("QUICK CHECK FAILED" if self.quick else "VALIDATION FAILED"))
             print(self.exception)
         else:
             print(Back.BLUE + "VALIDATION NOT FINISHED")
@@ -79,23 +142,127 @@ class ContestValidationResult(ValidationResult):
         for task_result in self.task_validation_results:
             task_result.print_summary()
 
-
-async def validate_task(task: Task, opts: argparse.Namespace) -> TaskValidationResult:
-    validation_result = TaskValidationResult(task)
-
+    def record_history(self, history: History):
+        for task_result in self.task_validation_results:
+            task_result.record_history(history)
+
+
+async def match_subtasks(task: Task, tests: Tests, validator: Union[Path, InputSpec],
+                         sample: Optional[int] = None, seed: Optional[int] = None):
+    """Sampled tests are drawn from `seed` and the task name"""
+    subtask_list = range(0, len(task.subtask_points))
+    sample_seed = f"{seed}:{task.name}"
+    if isinstance(validator, InputSpec):
+        await tests.match_subtasks(validator, subtask_list, True, sample, sample_seed)
+        return
+    compiled_validator = validator
+    if not task.validator_batch:
+        await tests.match_subtasks(compiled_validator, subtask_list, task.validator_subtasks,
+                                   sample, sample_seed)
+        return
+    subtask_count = len(task.subtask_points) if task.validator_subtasks else None
+    batch_validator = BatchValidator(compiled_validator, subtask_count)
+    await batch_validator.start()
     try:
-        test_dir = Path('testi_validator',  task.name)
-        if opts.extract:
-            await extract_tests(task.test_archive, test_dir, opts.dos2unix)
-        tests = Tests(task.point_file, test_dir, task.public_groups)
-        validation_result.set_tests(tests)
-
-        compiled_validator = Path('testi_validator', f'validator{task.name}')
-
-        await utility.compile_validator(task.validator, compiled_validator)
+        await tests.match_subtasks(batch_validator, subtask_list, task.validator_subtasks,
+                                   sample, sample_seed)
+    finally:
+        await batch_validator.close()
+
+
+async def check_test_manifest(task: Task, test_manifest: Dict, test_dir: Path,
+                              opts: argparse.Namespace, validation_result: TaskValidationResult):
+    if opts.dos2unix:
+        print(f"Skipping manifest check of {task.name}, dos2unix modifies test files")
+        return
+    print(f"Checking test files against manifest {task.manifest}")
+    # Hashes of the extracted files from previous runs, keyed by their size and mtime
+    cache_path = Path('testi_validator', f'manifest{task.name}.cache.json')
+    hash_cache = manifest.load_hash_cache(cache_path)
+    loop = asyncio.get_event_loop()
+    problems = await loop.run_in_executor(None, manifest.verify_manifest, test_manifest, test_dir, hash_cache)
+    manifest.write_hash_cache(cache_path, hash_cache)
+    if problems:
+        raise Exception('\n'.join(["MANIFEST FAIL:"] + problems))
+
+    # Manifest of the last verified archive, to report what changed since then
+    previous_path = Path('testi_validator', f'manifest{task.name}.json')
+    if previous_path.exists():
+        validation_result.set_changed_tests(
+            manifest.diff_manifests(manifest.load_manifest(previous_path), test_manifest))
+    manifest.write_manifest(previous_path, test_manifest)
+
+
+async def gather_or_cancel(*awaitables):
+    """asyncio.gather, but when one awaitable fails the others are cancelled
+    and waited for, so none keeps running after the caller has returned"""
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def prepare_task(task: Task, opts: argparse.Namespace, validation_result: TaskValidationResult):
+    test_dir = Path('testi_validator',  task.name)
+    if opts.extract:
+        await validation_result.timed('extract', extract_tests(task.test_archive, test_dir, opts.dos2unix))
+    test_manifest = None
+    if task.manifest:
+        test_manifest = manifest.load_manifest(task.manifest)
+        await validation_result.timed('manifest', check_test_manifest(task, test_manifest, test_dir,
+                                                                      opts, validation_result))
+    tests = Tests(task.point_file, test_dir, task.public_groups, test_manifest)
+    validation_result.set_tests(tests)
+
+    if task.input_spec:
+        validation_result.set_validator(task.input_spec)
+        return
+
+    compiled_validator = Path('testi_validator', f'validator{task.name}')
+
+    await validation_result.timed('compile_validator', utility.compile_validator(task.validator, compiled_validator))
+    validation_result.set_validator(compiled_validator)
+
+
+async def validate_task(task: Task, opts: argparse.Namespace, sample: Optional[int] = None,
+                        previous: Optional[TaskValidationResult] = None) -> TaskValidationResult:
+    """With `sample` only the smallest, the largest and `sample` random tests of
+    each group are validated. Tests and verdicts of a `previous` run are reused."""
+    reuse = previous is not None and previous.tests is not None and previous.validator is not None
+    validation_result = TaskValidationResult(task, sample is not None, reuse)
+    start = time.perf_counter()
 
-        await tests.match_subtasks(compiled_validator,
-                                   range(0, len(task.subtask_points)))
+    try:
+        if previous is not None and reuse:
+            validation_result.set_tests(previous.tests)
+            validation_result.set_validator(previous.validator)
+            if previous.changed_tests is not None:
+                validation_result.set_changed_tests(previous.changed_tests)
+        else:
+            await prepare_task(task, opts, validation_result)
+        tests = cast(Tests, validation_result.tests)
+        validator = cast(Union[Path, InputSpec], validation_result.validator)
+
+        check_solution = bool(task.solution) and opts.check_answers and sample is None
+        if check_solution:
+            compiled_solution = Path('testi_validator', f'solution{task.name}')
+            await validation_result.timed('compile_solution', utility.compile_solution(task.solution, compiled_solution))
+        subtask_matching = validation_result.timed('match_subtasks',
+                                                   match_subtasks(task, tests, validator, sample, opts.quick_seed))
+        if check_solution:
+            answer_mismatches, solution_times = (await gather_or_cancel(
+                subtask_matching,
+                validation_result.timed('answers', check_answers(
+                    compiled_solution, tests.get_answer_pairs(),
+                    Path('testi_validator', f'answers{task.name}')))))[1]
+            validation_result.set_answer_mismatches(answer_mismatches)
+            validation_result.set_solution_times(solution_times)
+        else:
+            await subtask_matching
 
         assignment = TestAssignment(task.subtask_points, tests)
 
@@ -103,19 +270,30 @@ async def validate_task(task: Task, opts: argparse.Namespace) -> TaskValidationR
 
         assignment.validate()
 
+        if validation_result.answer_mismatches:
+            raise Exception(f"ANSWER FAIL: {len(validation_result.answer_mismatches)} "
+                            "answers differ from the solution output")
+
         validation_result.set_success()
     except Exception as e:
         validation_result.set_fail(e)
 
+    # Wall time of the task, the other phases may overlap
+    validation_result.phases['total'] = time.perf_counter() - start
     return validation_result
 
 
-async def validate(obj: Union[Task, Contest], opts: argparse.Namespace) -> ValidationResult:
+async def validate(obj: Union[Task, Contest], opts: argparse.Namespace, sample: Optional[int] = None,
+                   previous: Optional[ValidationResult] = None) -> ValidationResult:
     if type(obj) is Contest:
         contest = cast(Contest, obj)
-        task_validation_results = list(await asyncio.gather(*(validate_task(task, opts) for task in contest.tasks)))
+        previous_results = cast(ContestValidationResult, previous).task_validation_results \
+            if previous is not None else [None] * len(contest.tasks)
+        task_validation_results = list(await asyncio.gather(
+            *(validate_task(task, opts, sample, task_previous)
+              for task, task_previous in zip(contest.tasks, previous_results))))
         return ContestValidationResult(contest, task_validation_results)
     else:
         task = cast(Task, obj)
-        return await validate_task(task, opts)
+        return await validate_task(task, opts, sample, cast(Optional[TaskValidationResult], previous))
 
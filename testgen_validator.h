@@ -0,0 +1,231 @@
+// Validator helpers for testgen.
+//
+// A validator built on this header works both as a classic one-shot
+// validator and in batch mode:
+//
+//   validator --group N < test       exit code 0 if the test matches subtask N
+//   validator --batch                reads jobs "<subtask> <path>" from stdin,
+//                                    answers each with "OK" or "FAIL <reason>"
+//
+// Example:
+//
+//   #include "testgen_validator.h"
+//
+//   void validate(std::istream& in, int subtask) {
+//       long long n;
+//       testgen::ensure(bool(in >> n), "missing n");
+//       testgen::ensure(1 <= n && n <= (subtask == 1 ? 1000 : 200000), "bad n");
+//   }
+//
+//   int main(int argc, char** argv) { return testgen::run(argc, argv, validate); }
+//
+// Enable batch mode for the task with "validator_batch: true" in task.yaml.
+//
+// Validators that check all subtasks in a single pass over the input use
+// run_subtasks instead and mark the subtasks whose constraints fail:
+//
+//   void validate(std::istream& in, testgen::Subtasks& subtasks) {
+//       long long n;
+//       testgen::ensure(bool(in >> n) && 1 <= n && n <= 200000, "bad n");
+//       subtasks.require(1, n <= 1000);
+//   }
+//
+//   int main(int argc, char** argv) {
+//       return testgen::run_subtasks(argc, argv, validate);
+//   }
+//
+//   validator --subtasks K < test    prints the matching subtasks of 0..K-1
+//   validator --batch --subtasks K   also accepts jobs "all <path>", answered
+//                                    with "SUBTASKS <list>" or "FAIL <reason>"
+//
+// Enable it with "validator_subtasks: true" in task.yaml. Such validators
+// still support "--group N" and "<subtask> <path>" batch jobs.
+
+#ifndef TESTGEN_VALIDATOR_H
+#define TESTGEN_VALIDATOR_H
+
+#include <algorithm>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <functional>
+#include <iostream>
+#include <sstream>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+namespace testgen {
+
+struct ValidationError : std::runtime_error {
+    explicit ValidationError(const std::string& what) : std::runtime_error(what) {}
+};
+
+inline void ensure(bool condition, const std::string& message) {
+    if (!condition) {
+        throw ValidationError(message);
+    }
+}
+
+class Subtasks {
+public:
+    explicit Subtasks(int count) : satisfied_(count, true) {}
+
+    // Subtask is matched only if all of its requirements hold. Subtasks
+    // outside of the requested range are ignored.
+    void require(int subtask, bool condition) {
+        if (!condition && 0 <= subtask && subtask < count()) {
+            satisfied_[subtask] = false;
+        }
+    }
+
+    bool satisfied(int subtask) const {
+        return 0 <= subtask && subtask < count() && satisfied_[subtask];
+    }
+
+    int count() const { return static_cast<int>(satisfied_.size()); }
+
+    std::string list() const {
+        std::string result;
+        for (int subtask = 0; subtask < count(); subtask++) {
+            if (satisfied_[subtask]) {
+                result += (result.empty() ? "" : " ") + std::to_string(subtask);
+            }
+        }
+        return result;
+    }
+
+private:
+    std::vector<bool> satisfied_;
+};
+
+using Validate = std::function<void(std::istream&, int)>;
+using ValidateSubtasks = std::function<void(std::istream&, Subtasks&)>;
+
+namespace detail {
+
+inline std::string one_line(std::string text) {
+    for (char& c : text) {
+        if (c == '\n' || c == '\r') {
+            c = ' ';
+        }
+    }
+    return text;
+}
+
+// Job handler receives the subtask field ("all" or a number) and the
+// opened test, returns the verdict line.
+using Job = std::function<std::string(const std::string&, std::istream&)>;
+
+inline int run_batch(const Job& job_handler) {
+    std::ios::sync_with_stdio(false);
+    std::string job;
+    while (std::getline(std::cin, job)) {
+        std::istringstream fields(job);
+        std::string subtask;
+        std::string path;
+        if (!(fields >> subtask) || !std::getline(fields >> std::ws, path)) {
+            std::cout << "FAIL malformed job '" << one_line(job) << "'" << std::endl;
+            continue;
+        }
+        std::ifstream in(path, std::ios::binary);
+        if (!in) {
+            std::cout << "FAIL cannot open " << one_line(path) << std::endl;
+            continue;
+        }
+        try {
+            std::cout << job_handler(subtask, in) << std::endl;
+        } catch (const std::exception& e) {
+            std::cout << "FAIL " << one_line(e.what()) << std::endl;
+        }
+    }
+    return 0;
+}
+
+inline int parse_subtask(const std::string& subtask) {
+    try {
+        return std::stoi(subtask);
+    } catch (const std::exception&) {
+        throw ValidationError("unsupported subtask '" + subtask + "'");
+    }
+}
+
+inline const char* option(int argc, char** argv, const char* name) {
+    for (int i = 1; i + 1 < argc; i++) {
+        if (std::strcmp(argv[i], name) == 0) {
+            return argv[i + 1];
+        }
+    }
+    return nullptr;
+}
+
+inline bool flag(int argc, char** argv, const char* name) {
+    for (int i = 1; i < argc; i++) {
+        if (std::strcmp(argv[i], name) == 0) {
+            return true;
+        }
+    }
+    return false;
+}
+
+}  // namespace detail
+
+inline int run(int argc, char** argv, const Validate& validate) {
+    if (detail::flag(argc, argv, "--batch")) {
+        return detail::run_batch([&](const std::string& subtask, std::istream& in) {
+            validate(in, detail::parse_subtask(subtask));
+            return std::string("OK");
+        });
+    }
+    const char* group = detail::option(argc, argv, "--group");
+    try {
+        validate(std::cin, group ? std::atoi(group) : -1);
+    } catch (const std::exception& e) {
+        std::cerr << e.what() << std::endl;
+        return 1;
+    }
+    return 0;
+}
+
+inline int run_subtasks(int argc, char** argv, const ValidateSubtasks& validate) {
+    const char* group = detail::option(argc, argv, "--group");
+    const char* count = detail::option(argc, argv, "--subtasks");
+    int subtask_count = count ? std::atoi(count) : 0;
+    if (group) {
+        subtask_count = std::max(subtask_count, std::atoi(group) + 1);
+    }
+
+    if (detail::flag(argc, argv, "--batch")) {
+        return detail::run_batch([&](const std::string& subtask, std::istream& in) {
+            Subtasks subtasks(subtask_count);
+            if (subtask == "all") {
+                validate(in, subtasks);
+                return "SUBTASKS " + subtasks.list();
+            }
+            int id = detail::parse_subtask(subtask);
+            if (id >= subtasks.count()) {
+                subtasks = Subtasks(id + 1);
+            }
+            validate(in, subtasks);
+            ensure(subtasks.satisfied(id), "subtask " + subtask + " constraints not satisfied");
+            return std::string("OK");
+        });
+    }
+
+    Subtasks subtasks(subtask_count);
+    try {
+        validate(std::cin, subtasks);
+    } catch (const std::exception& e) {
+        std::cerr << e.what() << std::endl;
+        return 1;
+    }
+    if (group) {
+        return subtasks.satisfied(std::atoi(group)) ? 0 : 1;
+    }
+    std::cout << subtasks.list() << std::endl;
+    return 0;
+}
+
+}  // namespace testgen
+
+#endif  // TESTGEN_VALIDATOR_H
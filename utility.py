@@ -1,10 +1,14 @@
 import asyncio
+import os
+import subprocess
 
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 class NonZeroReturnCode(Exception):
-    pass
+    def __init__(self, message: str, returncode: Optional[int] = None):
+        super().__init__(message)
+        self.returncode = returncode
 
 
 async def run(args: List[str]):
@@ -23,7 +27,50 @@ async def shell(args: List[str]):
         raise NonZeroReturnCode(f"Failed to execute shell command '{args}'. Returned {proc.returncode}")
 
 
+# Directory with testgen_validator.h
+INCLUDE_DIR = Path(__file__).resolve().parent
+
+
 async def compile_validator(validator: Path, output: Path):
     print(f"Compiling validator {validator}")
-    await run(["g++", "-Wall", "-std=c++17", "-o", str(output), str(validator)])
+    await run(["g++", "-Wall", "-std=c++17", "-I", str(INCLUDE_DIR),
+               "-o", str(output), str(validator)])
+
+
+async def compile_solution(solution: Path, output: Path):
+    print(f"Compiling solution {solution}")
+    await run(["g++", "-Wall", "-O2", "-std=c++17", "-o", str(output), str(solution)])
+
+
+def exit_code(status: int) -> int:
+    """Same as os.waitstatus_to_exitcode, which needs Python 3.9"""
+    return -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
 
+def cpu_time(args: List[str], stdin: Path, stdout: Optional[Path] = None) -> float:
+    """Blocking, runs the command and returns its user + system CPU time.
+    Output is discarded if `stdout` is not given."""
+    with stdin.open('rb') as fin, open(str(stdout) if stdout else os.devnull, 'wb') as fout:
+        proc = subprocess.Popen(args, stdin=fin, stdout=fout)
+        _, status, usage = os.wait4(proc.pid, 0)
+    # Already reaped, Popen must not wait for it again
+    proc.returncode = exit_code(status)
+    if proc.returncode != 0:
+        raise NonZeroReturnCode(f"Failed to execute command '{args}' < '{stdin}'. Returned {proc.returncode}",
+                                proc.returncode)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def run_timed(args: List[str], stdin: Path, stdout: Path) -> float:
+    """Runs cpu_time in an executor thread"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, cpu_time, args, stdin, stdout)
+
+
+async def run_output(args: List[str], stdin: Path) -> str:
+    with stdin.open('rb') as fin:
+        proc = await asyncio.create_subprocess_exec(*args, stdin=fin, stdout=asyncio.subprocess.PIPE)
+        output, _ = await proc.communicate()
+    if proc.returncode != 0:
+        raise NonZeroReturnCode(f"Failed to execute command '{args}' < '{stdin}'. Returned {proc.returncode}")
+    return output.decode()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import random
 import yaml
 import asyncio
 from pathlib import Path
@@ -9,6 +10,7 @@ from colorama import init
 from typing import List
 from test_validation import validate
 from task_units import Unit, Contest, Task, load_contest, load_task
+from history import History
 
 async def multiple_tasks(tasks):
     return await asyncio.gather(*tasks, return_exceptions=True)
@@ -16,7 +18,7 @@ async def multiple_tasks(tasks):
 
 def main(opts: argparse.Namespace):
 
-    evaluate = []
+    units: List[Unit] = []
     for config in opts.config:
         config_path = Path(config)
 
@@ -25,23 +27,51 @@ def main(opts: argparse.Namespace):
 
         # Contest configuration has "tasks" configuration
         if "tasks" in config:
-            loaded_contest = load_contest(config_path)
-            evaluate.append(validate(loaded_contest, opts))
+            units.append(load_contest(config_path))
         else:
-            loaded_task = load_task(config_path)
-            evaluate.append(validate(loaded_task, opts))
+            units.append(load_task(config_path))
 
+    sample = opts.quick_sample if opts.quick else None
+    if opts.quick and opts.quick_seed is None:
+        opts.quick_seed = random.randrange(1 << 32)
+    if opts.quick:
+        print(f"Quick check seed {opts.quick_seed}, repeat the same sample with --quick-seed {opts.quick_seed}")
     loop = asyncio.get_event_loop()
-    results = loop.run_until_complete(multiple_tasks(evaluate))
+    results = loop.run_until_complete(multiple_tasks([validate(unit, opts, sample) for unit in units]))
+
+    history = History(Path(opts.history)) if opts.history else None
 
     for result in results:
         result.print_summary()
+        if history and not isinstance(result, Exception):
+            result.record_history(history)
+
+    if opts.quick and opts.full:
+        print("Quick check done, continuing with full validation")
+        # Extracted tests, compiled validators and verdicts of the quick stage are reused
+        full = [validate(unit, opts, None, None if isinstance(result, Exception) else result)
+                for unit, result in zip(units, results)]
+        for result in loop.run_until_complete(multiple_tasks(full)):
+            result.print_summary()
+            if history and not isinstance(result, Exception):
+                result.record_history(history)
+
+    if history:
+        history.close()
+        print(f"Run recorded in {opts.history}, see history.py for trends")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--dos2unix", action="store_true")
     parser.add_argument("--use-extracted", dest="extract", action="store_false", help="Use tests from folder, do not extract from zip.")
+    parser.add_argument("--skip-answers", dest="check_answers", action="store_false", help="Do not compare archive answers with the solution output.")
+    parser.add_argument("--quick", action="store_true", help="Validate only the smallest, the largest and a few random tests of each group.")
+    parser.add_argument("--quick-sample", type=int, default=3, help="Random tests per group in --quick mode.")
+    parser.add_argument("--quick-seed", type=int, default=None, help="Seed of the --quick test sample, a random one is printed by default.")
+    parser.add_argument("--full", action="store_true", help="After --quick continue with the full validation.")
+    parser.add_argument("--history", type=str, default=str(Path('testi_validator', 'history.sqlite')), help="SQLite file storing run times.")
+    parser.add_argument("--no-history", dest="history", action="store_const", const=None, help="Do not record run times.")
     parser.add_argument(nargs="+", dest="config", type=str, help="Yaml file which defining contest or task")
     opts = parser.parse_args()
     init()
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import random
+import subprocess
+import utility
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+
+class IntRange:
+    """Integer generator argument in [low, high]"""
+
+    def __init__(self, low: int, high: int):
+        assert low <= high
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return f"IntRange({self.low}, {self.high})"
+
+    def sample(self, rng: random.Random) -> int:
+        return rng.randint(self.low, self.high)
+
+    def mutate(self, value: int, rng: random.Random) -> int:
+        # Mostly small local steps, sometimes a jump of up to ~20% of the range
+        spread = max(1, (self.high - self.low) // 5) if rng.random() < 0.3 else \
+            max(1, (self.high - self.low) // 50)
+        return min(self.high, max(self.low, value + rng.randint(-spread, spread)))
+
+
+class Choice:
+    """Generator argument taking one of the given values"""
+
+    def __init__(self, options: Sequence[Any]):
+        assert options
+        self.options = list(options)
+
+    def __repr__(self):
+        return f"Choice({self.options})"
+
+    def sample(self, rng: random.Random) -> Any:
+        return rng.choice(self.options)
+
+    def mutate(self, value: Any, rng: random.Random) -> Any:
+        return rng.choice(self.options)
+
+
+def is_variable(param) -> bool:
+    return isinstance(param, (IntRange, Choice))
+
+
+class WorstCaseSearch:
+    """Searches the generator argument space for the inputs on which the
+    solution spends the most CPU time.
+
+    Space is the generator argument list, where IntRange and Choice entries
+    are searched and every other value is passed to the generator as is.
+    """
+
+    def __init__(self, generator: Union[Path, Callable], solution: Path, space: Sequence[Any], work_dir: Path,
+                 workers: Optional[int] = None, seed: Optional[int] = None, repeats: int = 1):
+        self.generator = generator
+        self.solution = solution
+        self.space = list(space)
+        self.variables = [idx for idx, param in enumerate(self.space) if is_variable(param)]
+        self.work_dir = work_dir
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.rng = random.Random(seed)
+        self.repeats = repeats
+        self.results: Dict[Tuple, float] = {}
+        # Python generators run here, measuring threads wait for them
+        self.generation_pool: Optional[ProcessPoolExecutor] = None
+
+    def random_candidate(self) -> Tuple:
+        return tuple(param.sample(self.rng) if is_variable(param) else param for param in self.space)
+
+    def neighbour(self, args: Tuple) -> Tuple:
+        if not self.variables:
+            return args
+        changed = list(args)
+        idx = self.rng.choice(self.variables)
+        changed[idx] = self.space[idx].mutate(changed[idx], self.rng)
+        return tuple(changed)
+
+    def measure(self, slot: int, args: Tuple) -> float:
+        input = Path(self.work_dir, f"candidate{slot}")
+        if self.generation_pool is not None:
+            self.generation_pool.submit(write_candidate, self.generator, list(args), input).result()
+        else:
+            with input.open('w') as finp:
+                subprocess.run([str(self.generator)] + [str(arg) for arg in args], stdout=finp)\
+                    .check_returncode()
+        return min(utility.cpu_time([str(self.solution)], input) for _ in range(self.repeats))
+
+    def evaluate(self, executor: ThreadPoolExecutor, candidates: List[Tuple]):
+        candidates = list(dict.fromkeys(c for c in candidates if c not in self.results))
+        times = executor.map(self.measure, range(len(candidates)), candidates)
+        for args, time in zip(candidates, times):
+            print(f"\t{time:8.3f}s  {list(args)}")
+            self.results[args] = time
+
+    def search(self, iterations: int, strategy: str = "hill") -> List[Tuple[float, List]]:
+        """Evaluates about `iterations` candidates, `workers` of them at a time.
+
+        strategy "random" samples the whole space, "hill" starts randomly
+        and then mutates one argument of the currently slowest candidates.
+        """
+        if strategy not in ("random", "hill"):
+            raise Exception(f"Unknown search strategy {strategy}")
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        if callable(self.generator):
+            # Forked workers do not re-import the generation script's __main__
+            self.generation_pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                       mp_context=multiprocessing.get_context('fork'))
+        try:
+            self.run_search(iterations, strategy)
+        finally:
+            if self.generation_pool is not None:
+                self.generation_pool.shutdown()
+                self.generation_pool = None
+        return self.slowest(len(self.results))
+
+    def run_search(self, iterations: int, strategy: str):
+        stalled = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Small spaces run out of new candidates before `iterations`
+            while len(self.results) < iterations and stalled < 10:
+                batch = min(self.workers, iterations - len(self.results))
+                if strategy == "random" or not self.results:
+                    candidates = [self.random_candidate() for _ in range(batch)]
+                else:
+                    best = [args for _, args in self.slowest(max(1, batch // 2))]
+                    candidates = [self.neighbour(tuple(best[idx % len(best)])) for idx in range(batch)]
+                    # Keep exploring if the neighbourhood is exhausted
+                    candidates = [c if c not in self.results else self.random_candidate()
+                                  for c in candidates]
+                before = len(self.results)
+                self.evaluate(executor, candidates)
+                stalled = stalled + 1 if len(self.results) == before else 0
+
+    def slowest(self, count: int) -> List[Tuple[float, List]]:
+        ranked = sorted(self.results.items(), key=lambda item: item[1], reverse=True)
+        return [(time, list(args)) for args, time in ranked[:count]]
+
+    def print_summary(self, count: int = 5):
+        print("Slowest generator arguments:")
+        for time, args in self.slowest(count):
+            print(f"\tt.GenerateTest({args})  # {time:.3f}s")